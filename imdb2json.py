@@ -32,31 +32,87 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import argparse
-import collections
 import gzip
 import heapq
 import io
 import itertools
+import multiprocessing
+import operator
 import os
+import queue
 import re
 import sys
 import tempfile
+import threading
 
 try:
   import ujson as json
 except ImportError:
   import json
 
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+try:
+  import rapidgzip
+except ImportError:
+  rapidgzip = None
+
+try:
+  from isal import igzip
+except ImportError:
+  igzip = None
+
 STORE, APPEND = 0, 1
 TITLE, NAME = 'title', 'name'
 imdb_parsers = {TITLE: {}, NAME: {}}
 
 _OUT_BUF = 1000000
+_ERR_BUF = 1 << 16
+_IN_BUF = 1 << 17
+_PREFETCH_BATCH = 4096
 _MAX_SORT_BUF = 100000
+# rough size of one encoded sort run, the number of records per run is
+# raised after each run to reach it, but never below _MAX_SORT_BUF.
+# Small records then make fewer runs while big ones make no more than
+# before, and the records being sorted stay at a modest size in memory.
+_SORT_RUN_BYTES = 1 << 24
+# encoded runs up to this total are kept in memory rather than on disk
+_MEM_RUN_BYTES = 1 << 28
+
+# cpus we may actually run on, which under taskset/cgroups can be fewer
+# than os.cpu_count()
+_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') \
+  else os.cpu_count() or 1
+
+# section separator, parsers check l[0] == '-' first as it's a cheaper
+# test and almost no other line starts with a dash
+_SEP = '-' * 14
 
 sys.stdout = open(
   sys.stdout.fileno(), 'w', encoding='utf8', buffering=_OUT_BUF
 )
+# bad record warnings can run into the thousands on a broken dump, so
+# don't let each one be a write of its own
+sys.stderr = open(
+  sys.stderr.fileno(), 'w', encoding='utf8', errors='backslashreplace',
+  buffering=_ERR_BUF
+)
+
+# both take/return one line of JSON as bytes
+if orjson:
+  load_line = orjson.loads
+  def dump_line(obj):
+    return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+else:
+  load_line = json.loads
+  # ujson is compact already, have the stdlib encoder match it
+  _dumps = json.dumps if json.__name__ == 'ujson' \
+    else json.JSONEncoder(separators=(',', ':')).encode
+  def dump_line(obj):
+    return (_dumps(obj) + '\n').encode('utf8')
 
 TID_PAT = re.compile(r'''^
   (?:
@@ -84,34 +140,39 @@ def construct_title(id):
   rec = {'id': id}
   m = TID_PAT.match(id)
   if m:
-    if m.group('series'):
-      rec['title'] = m.group('series')
-      if m.group('epi'):
+    # all of TID_PAT's groups, in order
+    (
+      series, epi, epi_title, season, epi_no, epi_yr, epi_mon, epi_day,
+      non_series, tv, video, videogame, suspended
+    ) = m.groups()
+    if series:
+      rec['title'] = series
+      if epi:
         rec['episode'] = episode = {}
         rec['kind'] = 'episode'
-        if m.group('epi_title'):
-          episode['title'] = m.group('epi_title')
-        if m.group('season'):
-          episode['season'] = int(m.group('season'))
-        if m.group('episode'):
-          episode['episode'] = int(m.group('episode'))
-        if m.group('epi_yr'):
-          episode['year'] = int(m.group('epi_yr'))
-          episode['month'] = int(m.group('epi_mon'))
-          episode['day'] = int(m.group('epi_day'))
+        if epi_title:
+          episode['title'] = epi_title
+        if season:
+          episode['season'] = int(season)
+        if epi_no:
+          episode['episode'] = int(epi_no)
+        if epi_yr:
+          episode['year'] = int(epi_yr)
+          episode['month'] = int(epi_mon)
+          episode['day'] = int(epi_day)
       else:
         rec['kind'] = 'series'
     else:
-      rec['title'] = m.group('non_series')
-      if m.group('tv'):
+      rec['title'] = non_series
+      if tv:
         rec['kind'] = 'tv-movie'
-      elif m.group('video'):
+      elif video:
         rec['kind'] = 'video'
-      elif m.group('videogame'):
+      elif videogame:
         rec['kind'] = 'videogame'
       else:
         rec['kind'] = 'movie'
-    if m.group('suspended'):
+    if suspended:
       rec['suspended'] = True
   else:
     print('bad-tid', id, file=sys.stderr)
@@ -123,61 +184,179 @@ def construct_name(id):
 
 constructors = {TITLE: construct_title, NAME: construct_name}
 
-def roundrobin(*iterables):
-  pending = len(iterables)
-  nexts = itertools.cycle(iter(it).__next__ for it in iterables)
-  while pending:
-    try:
-      for next in nexts:
-        yield next()
-    except StopIteration:
-      pending -= 1
-      nexts = itertools.cycle(itertools.islice(nexts, pending))
+def prefetch(it):
+  # drive `it` from its own thread so that per file inflate (which
+  # releases the GIL) and parsing overlap with the rest of the pipeline;
+  # items are handed over, and yielded, in batches (lists) to keep the
+  # per item overhead low
+  q = queue.Queue(maxsize=8)
 
-def rec_sorted(recs):
-  srtd = collections.deque()
-  temps = collections.deque()
+  def run():
+    try:
+      batch = list(itertools.islice(it, _PREFETCH_BATCH))
+      while batch:
+        q.put(batch)
+        batch = list(itertools.islice(it, _PREFETCH_BATCH))
+    except BaseException as e:
+      q.put(e)
+    q.put(None)
+
+  threading.Thread(target=run, daemon=True).start()
+  for batch in iter(q.get, None):
+    if isinstance(batch, BaseException):
+      raise batch
+    yield batch
+
+def temp_run():
+  return tempfile.TemporaryFile(buffering=_IN_BUF)
+
+def sort_runs(batches, new_run=temp_run, mem_bytes=0):
+  # cut the records of batches into sorted runs, each in its own binary
+  # file from new_run() and rewound ready for merge_runs; the first
+  # mem_bytes worth of runs are kept as in memory files instead
+  by_id = operator.itemgetter(0)
+  srtd = []
+  runs = []
+  limit = _MAX_SORT_BUF
 
   def write_tmp():
-    tmp = tempfile.TemporaryFile()
-    tmpw = open(
-      tmp.fileno(), 'w', encoding='utf8', buffering=_OUT_BUF,
-      closefd=False
-    )
-    for sr in sorted(srtd, key=lambda x: x[0]):
-      json.dump(sr, tmpw)
-      tmpw.write('\n')
-    tmpw.flush()
-    del tmpw
-    tmp.seek(0)
+    nonlocal limit, mem_bytes
+    # sorted in place (stable, so arrival order within an id is kept),
+    # encoded in one go and handed to the file as a single write
+    srtd.sort(key=by_id)
+    buf = b''.join(map(dump_line, srtd))
+    # records differ in size by orders of magnitude between lists (a
+    # year vs a plot), so aim the next run at a size in bytes instead
+    limit = max(_MAX_SORT_BUF, _SORT_RUN_BYTES * len(srtd) // len(buf))
     srtd.clear()
-    temps.append(tmp)
+    if len(buf) <= mem_bytes:
+      mem_bytes -= len(buf)
+      runs.append(io.BytesIO(buf))
+      return
+    tmp = new_run()
+    tmp.write(buf)
+    tmp.seek(0)
+    runs.append(tmp)
 
-  for rec in recs:
-    srtd.append(rec)
-    if len(srtd) >= _MAX_SORT_BUF:
+  for batch in batches:
+    srtd.extend(batch)
+    if len(srtd) >= limit:
       write_tmp()
   if srtd:
     write_tmp()
-
-  yield from heapq.merge(*((
-    tuple(json.loads(i)) for i in open(f.fileno(), 'r', encoding='utf8')
-  ) for f in temps), key=lambda x: x[0])
-
-def load_parser(kind, f):
-  f = open(f.fileno(), 'rb')
+  return runs
+
+def sort_file_runs(kind, dir, i, fd, threads):
+  # sort_runs() of the i-th input file into dir as i.0, i.1, ... and
+  # return how many there are, run in a worker process
+  n = itertools.count()
+  runs = sort_runs(
+    prefetch(load_parser(kind, open(fd, 'rb', closefd=False), threads)),
+    lambda: open(os.path.join(dir, '%d.%d' % (i, next(n))), 'w+b')
+  )
+  for run in runs:
+    run.close()
+  return len(runs)
+
+def parallel_runs(kind, files, jobs):
+  # sort_runs() of every file, each in a forked worker which inherits
+  # the open input fds. Runs come back in input order so merge ties keep
+  # going to earlier files, and are unlinked as soon as they're open.
+  # Biggest files are handed out first so that a large one doesn't start
+  # last and leave the other workers idle. The cpus are shared out
+  # between the workers for their decompressors to use.
+  threads = max(1, _CPUS // jobs)
+  fds = [f.fileno() for f in files]
+  order = sorted(
+    range(len(fds)), key=lambda i: os.fstat(fds[i]).st_size, reverse=True
+  )
+  with tempfile.TemporaryDirectory() as dir:
+    with multiprocessing.get_context('fork').Pool(jobs) as pool:
+      counts = dict(zip(order, pool.starmap(sort_file_runs, [
+        (kind, dir, i, fds[i], threads) for i in order
+      ], chunksize=1)))
+      # let workers exit normally, flushing their std streams
+      pool.close()
+      pool.join()
+    return [
+      open(os.path.join(dir, '%d.%d' % (i, n)), 'rb', buffering=_IN_BUF)
+      for i in range(len(fds)) for n in range(counts[i])
+    ]
+
+def merge_runs(runs):
+  # k-way merge of the sorted runs, handing out all the records of an id
+  # at once. Heap entries are [id, run index, record, next] lists that are
+  # updated in place; ties on id go to the earlier run which keeps the
+  # records in the order they were produced.
+  heap = []
+  for i, f in enumerate(runs):
+    run = map(load_line, f)
+    rec = next(run, None)
+    if rec is not None:
+      heap.append([rec[0], i, rec, run.__next__])
+  heapq.heapify(heap)
+
+  heappop, heapreplace = heapq.heappop, heapq.heapreplace
+  while heap:
+    top = heap[0]
+    id, group = top[0], []
+    while top[0] == id:
+      group.append(top[2])
+      try:
+        top[2] = rec = top[3]()
+        top[0] = rec[0]
+        heapreplace(heap, top)
+      except StopIteration:
+        heappop(heap)
+        if not heap:
+          break
+      top = heap[0]
+    yield id, group
+
+def read_lines(f):
+  # latin1 maps bytes 1:1 to code points, so decoding big chunks and
+  # splitting them is much cheaper than a line at a time TextIOWrapper.
+  # Lines are handed out a chunk's worth at a time by chain() so that no
+  # Python frame is resumed per line.
+  def chunks():
+    tail = ''
+    for chunk in iter(lambda: f.read(_IN_BUF), b''):
+      text, cr = tail + chunk.decode('latin1'), ''
+      if '\r' in text:
+        # universal newlines, as the text mode gzip.open() gave us. A \r
+        # at the very end is held back in case a \n follows it.
+        if text[-1] == '\r':
+          text, cr = text[:-1], '\r'
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+      lines = text.split('\n')
+      tail = lines.pop() + cr
+      yield lines
+    if tail:
+      yield [tail]
+  return itertools.chain.from_iterable(chunks())
+
+HEAD_PAT = re.compile(r'\sFile:\s+([^.]+)\.list\b')
+
+def load_parser(kind, f, threads=_CPUS):
+  f = open(f.fileno(), 'rb', buffering=_IN_BUF)
   if f.peek(1)[:1] == b'\x1f':
-    f = gzip.open(f, 'rt', encoding='latin1')
-  else:
-    f = io.TextIOWrapper(f, encoding='latin1')
-  m = re.search(r'\sFile:\s+([^.]+)\.list\s+', f.readline())
+    if rapidgzip and f.seekable():
+      # parallel inflate, needs to seek to find deflate block boundaries
+      f = rapidgzip.open(f, parallelization=threads)
+    elif igzip:
+      # ISA-L inflate, still single threaded but a lot faster than zlib
+      f = igzip.IGzipFile(fileobj=f)
+    else:
+      f = gzip.GzipFile(fileobj=f)
+  f = read_lines(f)
+  m = HEAD_PAT.search(next(f, ''))
   if not m:
     return
   parser = imdb_parsers[kind].get(m.group(1))
   if not parser:
     return
   if parser:
-    yield from parser(filter(bool, (l.rstrip() for l in f)))
+    yield from parser(filter(None, map(str.rstrip, f)))
 
 def imdb_parser(kind, filename):
   def wrapper(fn):
@@ -185,58 +364,73 @@ def imdb_parser(kind, filename):
     return fn
   return wrapper
 
-def skip_till(f, window, pat):
-  pat = re.compile(pat)
-  deq = collections.deque(maxlen=window)
+def skip_till(f, head, rule='=' * 8):
+  # consume f up to and including the line that starts with `rule` and
+  # directly follows `head`, whitespace within `head` is insignificant
+  head, prev = head.split(), ''
   for l in f:
-    deq.append(l)
-    if pat.search('\n'.join(deq)):
+    if l.startswith(rule) and prev.split() == head:
       break
+    prev = l
 
 @imdb_parser(kind=TITLE, filename='movies')
 def parse_movies(f):
 
-  skip_till(f, 2, r'^MOVIES LIST\n={8}')
+  skip_till(f, 'MOVIES LIST')
 
+  # there are only a few hundred distinct year ranges, parse each once
+  years = {}
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
     l = l.split('\t')
-    yr = [None if x == '????' else int(x) for x in l[-1].split('-', 1)]
+    yr = years.get(l[-1])
+    if yr is None:
+      yr = years[l[-1]] = [
+        None if x == '????' else int(x) for x in l[-1].split('-', 1)
+      ]
     yield l[0], STORE, 'year', yr
 
 @imdb_parser(kind=TITLE, filename='taglines')
 def parse_taglines(f):
 
-  skip_till(f, 2, r'^TAG LINES LIST\n={8}')
+  skip_till(f, 'TAG LINES LIST')
 
   id = None
   for l in f:
-    if l.startswith('--------------'):
-      break
-    if l.startswith('#'):
+    c = l[0]
+    if c == '\t':
+      if id:
+        yield id, APPEND, 'taglines', l[1:]
+    elif c == '#':
       id = l[2:]
-    elif l.startswith('\t') and id:
-      yield id, APPEND, 'taglines', l[1:]
+    elif c == '-' and l.startswith(_SEP):
+      break
 
 def parse_bullet_pt(f, key):
 
+  # lines of the current bullet point, one buffer reused for all points;
+  # line kinds are told apart by their first two chars, continuation
+  # lines being the most common are checked first
   id, pts, lines = None, [], []
   for l in f:
-    if l.startswith('--------------'):
-      break
-    if l.startswith('#'):
+    c = l[:2]
+    if c == '  ':
+      lines.append(l[2:].strip())
+    elif c == '- ':
       if lines:
         pts.append(' '.join(lines))
-      if pts:
-        yield id, STORE, key, pts
-      id, pts, lines = l[2:], [], []
-    elif l.startswith('- '):
+        lines.clear()
+      lines.append(l[2:].strip())
+    elif c[0] == '#':
       if lines:
         pts.append(' '.join(lines))
-      lines = [l[2:].strip()]
-    elif l.startswith('  '):
-      lines.append(l[2:].strip())
+        lines.clear()
+      if pts:
+        yield id, STORE, key, pts
+      id, pts = l[2:], []
+    elif c[0] == '-' and l.startswith(_SEP):
+      break
 
   if lines:
     pts.append(' '.join(lines))
@@ -245,96 +439,130 @@ def parse_bullet_pt(f, key):
 
 @imdb_parser(kind=TITLE, filename='trivia')
 def parse_trivia(f):
-  skip_till(f, 2, r'^FILM TRIVIA\n={8}')
+  skip_till(f, 'FILM TRIVIA')
   yield from parse_bullet_pt(f, 'trivia')
 
 @imdb_parser(kind=TITLE, filename='alternate-versions')
 def parse_alternate_versions(f):
-  skip_till(f, 2, r'^ALTERNATE VERSIONS LIST\n={8}')
+  skip_till(f, 'ALTERNATE VERSIONS LIST')
   yield from parse_bullet_pt(f, 'alternate_versions')
 
 @imdb_parser(kind=TITLE, filename='crazy-credits')
 def parse_crazy_credits(f):
-  skip_till(f, 2, r'^CRAZY CREDITS\n={8}')
+  skip_till(f, 'CRAZY CREDITS')
   yield from parse_bullet_pt(f, 'crazy_credits')
 
+GOOF_TYPES = {
+  'CONT': 'continuity', 'FAKE': 'revealing',
+  'FACT': 'factual', 'GEOG': 'geographical',
+  'PLOT': 'plothole', 'FAIR': 'not_goof',
+  'CREW': 'crew_visible', 'DATE': 'date',
+  'CHAR': 'character', 'SYNC': 'audio_video_sync',
+  'MISC': 'misc', 'BOOM': 'boom_mic_visible'
+}
+
 @imdb_parser(kind=TITLE, filename='goofs')
 def parse_goofs(f):
 
-  skip_till(f, 2, r'^GOOFS LIST\n={8}')
-
-  type_map = {
-    'CONT': 'continuity', 'FAKE': 'revealing',
-    'FACT': 'factual', 'GEOG': 'geographical',
-    'PLOT': 'plothole', 'FAIR': 'not_goof',
-    'CREW': 'crew_visible', 'DATE': 'date',
-    'CHAR': 'character', 'SYNC': 'audio_video_sync',
-    'MISC': 'misc', 'BOOM': 'boom_mic_visible'
-  }
+  skip_till(f, 'GOOFS LIST')
 
   for id, mix, key, pts in parse_bullet_pt(f, 'goofs'):
     yield id, mix, key, [{
-      'type': type_map[p[:4]],
+      'type': GOOF_TYPES[p[:4]],
       'text': p[6:]
     } for p in pts]
 
 @imdb_parser(kind=TITLE, filename='language')
 def parse_language(f):
 
-  skip_till(f, 2, r'^LANGUAGE LIST\n={8}')
+  skip_till(f, 'LANGUAGE LIST')
 
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
-    l = [i for i in l.split('\t') if i]
-    lang = {'name': l[1]}
-    if len(l) > 2:
-      lang['note'] = l[2]
-    yield l[0], APPEND, 'languages', lang
+    # id, value and an optional note, with runs of tabs between them;
+    # partition() is about twice as fast as splitting and filtering
+    # for these few fields
+    id, _, val = l.partition('\t')
+    val, _, note = val.lstrip('\t').partition('\t')
+    lang = {'name': val}
+    if note:
+      lang['note'] = note.lstrip('\t').partition('\t')[0]
+    yield id, APPEND, 'languages', lang
+
+RT_PAT = re.compile(r'''
+  ^(?:(?P<country>[^:]+):)? # optional country
+  \s*(?:
+    (?P<H>\d+):(?P<M>\d+):(?P<S>\d+) # H,M,S
+  |
+    (?P<M2>\d+)
+    (?:
+      \s*(?:[:,']|m|min[s.]?|minutes)\s*
+      (?:(?P<S2>\d+)\s*(?:"|''|s|sec[.s]?|seconds)?)?
+    )? # M,S
+  |
+    (?P<M3>\d+)\.(?P<S3>\d+) # M.S
+  )(?:\s*[x*].*|\s*\d+\s*episodes)?$
+''', re.X | re.I)
+
+def running_time(val):
+  # plain "[country:]M", "M min", "M.S" and "H:M:S" cover the vast
+  # majority of the lines and are cheap to take apart by hand, the rest
+  # (including any non-ASCII whitespace) go to RT_PAT
+  country, sep, rest = val.partition(':')
+  if not sep:
+    country, rest = None, val
+  if country != '':
+    rest = rest.lstrip(' \t\n\r\f\v')
+    if rest.isdecimal():
+      return country, int(rest) * 60
+    if rest[-3:].lower() == 'min':
+      mins = rest[:-3].rstrip(' \t\n\r\f\v')
+      if mins.isdecimal():
+        return country, int(mins) * 60
+    mins, dot, secs = rest.partition('.')
+    if dot:
+      if mins.isdecimal() and secs.isdecimal():
+        return country, int(mins) * 60 + (30 if secs == '5' else int(secs))
+    else:
+      hms = rest.split(':')
+      if len(hms) == 3 and all(i.isdecimal() for i in hms):
+        return country, \
+          int(hms[0]) * 3600 + int(hms[1]) * 60 + int(hms[2])
+
+  rt = RT_PAT.match(val)
+  if not rt:
+    return None
+  # FIXME even if we match country fine, we can still fail the
+  #       complete match and hence lose the country info too
+  if rt.group('M2'):
+    secs = int(rt.group('M2')) * 60
+    if rt.group('S2'):
+      secs += int(rt.group('S2'))
+  elif rt.group('H'):
+    secs = int(rt.group('H')) * 3600 \
+      + int(rt.group('M')) * 60 + int(rt.group('S'))
+  elif rt.group('M3'):
+    secs = int(rt.group('M3')) * 60
+    secs += 30 if rt.group('S3') == '5' else int(rt.group('S3'))
+  return rt.group('country'), secs
 
 @imdb_parser(kind=TITLE, filename='running-times')
 def parse_running_times(f):
 
-  skip_till(f, 2, r'^RUNNING TIMES LIST\n={8}')
-
-  rt_pat = re.compile(r'''
-    ^(?:(?P<country>[^:]+):)? # optional country
-    \s*(?:
-      (?P<H>\d+):(?P<M>\d+):(?P<S>\d+) # H,M,S
-    |
-      (?P<M2>\d+)
-      (?:
-        \s*(?:[:,']|m|min[s.]?|minutes)\s*
-        (?:(?P<S2>\d+)\s*(?:"|''|s|sec[.s]?|seconds)?)?
-      )? # M,S
-    |
-      (?P<M3>\d+)\.(?P<S3>\d+) # M.S
-    )(?:\s*[x*].*|\s*\d+\s*episodes)?$
-    ''', re.X | re.I
-  )
+  skip_till(f, 'RUNNING TIMES LIST')
 
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
-    l = [i for i in l.split('\t') if i]
+    l = list(filter(None, l.split('\t')))
 
-    rt = rt_pat.match(l[1])
+    rt = running_time(l[1])
     if rt:
-      # FIXME even if we match country fine, we can still fail the
-      #       complete match and hence lose the country info too
-      country = (rt.group('country') or '').strip() or None
-      if rt.group('M2'):
-        secs = int(rt.group('M2')) * 60
-        if rt.group('S2'):
-          secs += int(rt.group('S2'))
-      elif rt.group('H'):
-        secs = int(rt.group('H')) * 3600 \
-          + int(rt.group('M')) * 60 + int(rt.group('S'))
-      elif rt.group('M3'):
-        secs = int(rt.group('M3')) * 60
-        secs += 30 if rt.group('S3') == '5' else int(rt.group('S3'))
+      country, secs = rt
+      country = (country or '').strip() or None
     else:
-      secs = None
+      country, secs = None, None
       print('bad-running-time:', l, file=sys.stderr)
 
     note = l[2].strip() if len(l) > 2 else ''
@@ -345,16 +573,19 @@ def parse_running_times(f):
     note = note.strip() or None
 
     obj = {}
-    for k, v in zip(['secs', 'country', 'note'], [secs, country, note]):
-      if v is not None:
-        obj[k] = v
+    if secs is not None:
+      obj['secs'] = secs
+    if country is not None:
+      obj['country'] = country
+    if note is not None:
+      obj['note'] = note
 
     yield l[0], APPEND, 'running_times', obj
 
 @imdb_parser(kind=TITLE, filename='keywords')
 def parse_keywords(f):
 
-  skip_till(f, 2, r'^8: THE KEYWORDS LIST\n={8}')
+  skip_till(f, '8: THE KEYWORDS LIST')
 
   for l in f:
     l = l.split('\t')
@@ -363,41 +594,45 @@ def parse_keywords(f):
 @imdb_parser(kind=TITLE, filename='genres')
 def parse_genres(f):
 
-  skip_till(f, 2, r'^8: THE GENRES LIST\n={8}')
+  skip_till(f, '8: THE GENRES LIST')
 
   for l in f:
     l = l.split('\t')
     yield l[0], APPEND, 'genres', l[-1].strip()
 
+TECH_TYPES = {
+  'RAT': 'ratios', 'CAM': 'cameras', 'MET': 'lengths',
+  'PCS': 'processes', 'LAB': 'lab', 'OFM': 'negatives',
+  'PFM': 'prints'
+}
+
 @imdb_parser(kind=TITLE, filename='technical')
 def parse_technical(f):
 
-  skip_till(f, 2, r'^TECHNICAL LIST\n={8}')
+  skip_till(f, 'TECHNICAL LIST')
 
   for l in f:
-    l = [i for i in l.split('\t') if i]
-    typ, val = l[1].split(':', 1)
-    typ = {
-      'RAT': 'ratios', 'CAM': 'cameras', 'MET': 'lengths',
-      'PCS': 'processes', 'LAB': 'lab', 'OFM': 'negatives',
-      'PFM': 'prints'
-    }[typ]
+    # see parse_language
+    id, _, val = l.partition('\t')
+    val, _, note = val.lstrip('\t').partition('\t')
+    typ, val = val.split(':', 1)
+    typ = TECH_TYPES[typ]
     val = {'name': val}
-    if len(l) > 2:
-      val['note'] = l[2]
-    yield l[0], APPEND, typ, val
+    if note:
+      val['note'] = note.lstrip('\t').partition('\t')[0]
+    yield id, APPEND, typ, val
 
 @imdb_parser(kind=TITLE, filename='aka-titles')
 def parse_aka_titles(f):
 
-  skip_till(f, 2, r'^AKA TITLES LIST\n={8}')
+  skip_till(f, 'AKA TITLES LIST')
 
   id = None
   for l in f:
     if l.startswith(' ') and id:
-      l = [i for i in l.split('\t') if i]
+      l = list(filter(None, l.split('\t')))
       if not l[0].startswith('   (aka ') or not l[0].endswith(')'):
-        print('bad-aka-title', l)
+        print('bad-aka-title', l, file=sys.stderr)
         continue
       aka = {'name': l[0][8:-1]} # TODO extract yr, etc
       if len(l) > 1:
@@ -409,39 +644,45 @@ def parse_aka_titles(f):
 @imdb_parser(kind=TITLE, filename='certificates')
 def parse_certificates(f):
 
-  skip_till(f, 2, r'^CERTIFICATES LIST\n={8}')
+  skip_till(f, 'CERTIFICATES LIST')
 
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
-    l = [i for i in l.split('\t') if i]
+    # see parse_language
+    id, _, val = l.partition('\t')
+    val, _, note = val.lstrip('\t').partition('\t')
     cert = {}
-    cert['country'], cert['rating'] = l[1].split(':', 1)
-    if len(l) > 2:
-      cert['note'] = l[2] # TODO parse the data into sep fields
-    yield l[0], APPEND, 'certificates', cert
+    cert['country'], cert['rating'] = val.split(':', 1)
+    if note:
+      # TODO parse the data into sep fields
+      cert['note'] = note.lstrip('\t').partition('\t')[0]
+    yield id, APPEND, 'certificates', cert
 
 @imdb_parser(kind=TITLE, filename='color-info')
 def parse_color_info(f):
 
-  skip_till(f, 2, r'^COLOR INFO LIST\n={8}')
+  skip_till(f, 'COLOR INFO LIST')
 
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
-    l = [i for i in l.split('\t') if i]
-    info = {'color': l[1].lower()}
-    if len(l) > 2:
-      info['note'] = l[2] # TODO parse the data into sep fields
-    yield l[0], APPEND, 'color_info', info
+    # see parse_language
+    id, _, val = l.partition('\t')
+    val, _, note = val.lstrip('\t').partition('\t')
+    info = {'color': val.lower()}
+    if note:
+      # TODO parse the data into sep fields
+      info['note'] = note.lstrip('\t').partition('\t')[0]
+    yield id, APPEND, 'color_info', info
 
 @imdb_parser(kind=TITLE, filename='countries')
 def parse_countries(f):
 
-  skip_till(f, 2, r'^COUNTRIES LIST\n={8}')
+  skip_till(f, 'COUNTRIES LIST')
 
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
     l = l.split('\t')
     yield l[0], APPEND, 'countries', l[-1]
@@ -449,23 +690,26 @@ def parse_countries(f):
 @imdb_parser(kind=TITLE, filename='distributors')
 def parse_distributors(f):
 
-  skip_till(f, 2, r'^DISTRIBUTORS LIST\n={8}')
+  skip_till(f, 'DISTRIBUTORS LIST')
 
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
-    l = [i for i in l.split('\t') if i]
-
-    dist = {'name': l[1]} # TODO parse country out
-    if len(l) > 2:
-      dist['note'] = l[2] # TODO separate fields
+    # see parse_language
+    id, _, val = l.partition('\t')
+    val, _, note = val.lstrip('\t').partition('\t')
+
+    dist = {'name': val} # TODO parse country out
+    if note:
+      # TODO separate fields
+      dist['note'] = note.lstrip('\t').partition('\t')[0]
     
-    yield l[0], APPEND, 'distributors', dist
+    yield id, APPEND, 'distributors', dist
 
 @imdb_parser(kind=TITLE, filename='literature')
 def parse_literature(f):
 
-  skip_till(f, 2, r'^LITERATURE LIST\n={8}')
+  skip_till(f, 'LITERATURE LIST')
 
   typ_map = {
     'ADPT': 'adaptations', 'BOOK': 'books', 'NOVL': 'novels',
@@ -478,7 +722,7 @@ def parse_literature(f):
   id = None
 
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       id = None
     elif l.startswith('MOVI:'):
       id = l[6:]
@@ -488,173 +732,185 @@ def parse_literature(f):
 @imdb_parser(kind=TITLE, filename='locations')
 def parse_locations(f):
 
-  skip_till(f, 2, r'^LOCATIONS LIST\n={8}')
+  skip_till(f, 'LOCATIONS LIST')
 
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
-    l = [i for i in l.split('\t') if i]
-    loc = {'name': l[1]}
-    if len(l) > 2:
-      loc['note'] = l[2]
-    yield l[0], APPEND, 'locations', loc
+    # see parse_language
+    id, _, val = l.partition('\t')
+    val, _, note = val.lstrip('\t').partition('\t')
+    loc = {'name': val}
+    if note:
+      loc['note'] = note.lstrip('\t').partition('\t')[0]
+    yield id, APPEND, 'locations', loc
 
 def parse_companies(f, type):
 
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
-    l = [i for i in l.split('\t') if i]
-    comp = {'name': l[1], 'type': type}
-    if len(l) > 2:
-      comp['note'] = l[2]
-    yield l[0], APPEND, 'companies', comp
+    # see parse_language
+    id, _, val = l.partition('\t')
+    val, _, note = val.lstrip('\t').partition('\t')
+    comp = {'name': val, 'type': type}
+    if note:
+      comp['note'] = note.lstrip('\t').partition('\t')[0]
+    yield id, APPEND, 'companies', comp
 
 @imdb_parser(kind=TITLE, filename='miscellaneous-companies')
 def parse_miscellaneous_companies(f):
-  skip_till(f, 2, r'^MISCELLANEOUS COMPANIES LIST\n={8}')
+  skip_till(f, 'MISCELLANEOUS COMPANIES LIST')
   yield from parse_companies(f, 'miscellaneous')
 
 @imdb_parser(kind=TITLE, filename='production-companies')
 def parse_production_companies(f):
-  skip_till(f, 2, r'^PRODUCTION COMPANIES LIST\n={8}')
+  skip_till(f, 'PRODUCTION COMPANIES LIST')
   yield from parse_companies(f, 'production')
 
 @imdb_parser(kind=TITLE, filename='special-effects-companies')
 def parse_special_effects_companies(f):
-  skip_till(f, 2, r'^SPECIAL EFFECTS COMPANIES LIST\n={8}')
+  skip_till(f, 'SPECIAL EFFECTS COMPANIES LIST')
   yield from parse_companies(f, 'special_effects')
 
+LINK_RELS = {
+  'follows': 'follows',
+  'followed by': 'followed_by',
+  'version of': 'alt_version',
+  'alternate language version of': 'alt_language'
+}
+LINK_PAT = re.compile(r'  \((%s) ' % '|'.join(LINK_RELS))
+
 @imdb_parser(kind=TITLE, filename='movie-links')
 def parse_movie_links(f):
 
-  skip_till(f, 2, r'^MOVIE LINKS LIST\n={8}')
-
-  rel_map = {
-    '  (follows ': 'follows',
-    '  (followed by ': 'followed_by',
-    '  (version of ': 'alt_version',
-    '  (alternate language version of ': 'alt_language'
-  }
+  skip_till(f, 'MOVIE LINKS LIST')
 
   id = None
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
     if l.startswith(' ') and id:
-      for relf, relt in rel_map.items():
-        if l.startswith(relf):
-          link = {'title': l[len(relf):-1], 'rel': relt}
-          yield id, APPEND, 'links', link
-          break
+      # one match tells the wanted relations apart and, more commonly,
+      # rejects all the others (references, spoofs, ...) in one go
+      m = LINK_PAT.match(l)
+      if m:
+        link = {'title': l[m.end():-1], 'rel': LINK_RELS[m.group(1)]}
+        yield id, APPEND, 'links', link
     else:
       id = l
 
+MPAA_PAT = re.compile(r'''
+  ^\s*[:-]?\s*Rated\s+(?P<rating>.+?)
+  (?:\s+(?P<reason>(?:on|for)\s+.+))?$
+''', re.X | re.I)
+
 @imdb_parser(kind=TITLE, filename='mpaa-ratings-reasons')
 def parse_mpaa_ratings_reasons(f):
 
-  skip_till(f, 2, r'^MPAA RATINGS REASONS LIST\n={8}')
-
-  pat = re.compile(r'''
-    ^\s*[:-]?\s*Rated\s+(?P<rating>.+?)
-    (?:\s+(?P<reason>(?:on|for)\s+.+))?$
-  ''', re.X | re.I)
+  skip_till(f, 'MPAA RATINGS REASONS LIST')
 
   def build(rr):
     rr = ' '.join(rr)
-    m = pat.match(rr)
+    m = MPAA_PAT.match(rr)
     if m:
-      rr = {'rating': m.group('rating').replace(' ', '')}
-      if m.group('reason'):
-        rr['reason'] = m.group('reason')
+      rating, reason = m.groups()
+      rr = {'rating': rating.replace(' ', '')}
+      if reason:
+        rr['reason'] = reason
       return id, STORE, 'mpaa_rating', rr
     else:
       print('bad-mpaa', rr, file=sys.stderr)
 
   id, rr = None, []
   for l in f:
-    if l.startswith('--------------'):
+    tag = l[:4]
+    if tag == 'RE: ':
+      rr.append(l[4:])
+    elif tag == 'MV: ':
+      id = l[4:]
+    elif l[0] == '-' and l.startswith(_SEP):
       if rr and id:
         rr = build(rr)
         if rr:
           yield rr
       id, rr = None, []
-    elif l.startswith('MV: '):
-      id = l[4:]
-    elif l.startswith('RE: '):
-      rr.append(l[4:])
 
   if rr and id:
     rr = build(rr)
     if rr:
       yield rr
 
+RATING_PAT = re.compile(r'^\s+([^\s]+)\s+(\d+)\s+([\d.]+)\s+(.*)$')
+
 @imdb_parser(kind=TITLE, filename='ratings')
 def parse_ratings(f):
 
-  skip_till(f, 2, r'^MOVIE RATINGS REPORT\nNew\s+Distri')
-
-  pat = re.compile(r'^\s+([^\s]+)\s+(\d+)\s+([\d.]+)\s+(.*)$')
+  skip_till(f, 'MOVIE RATINGS REPORT', 'New')
 
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
-    m = pat.match(l)
-    yield m.group(4), STORE, 'rating', {
-      'rank': float(m.group(3)), 'votes': int(m.group(2)),
-      'distribution': m.group(1)
+    dist, votes, rank, id = RATING_PAT.match(l).groups()
+    yield id, STORE, 'rating', {
+      'rank': float(rank), 'votes': int(votes), 'distribution': dist
     }
 
 @imdb_parser(kind=TITLE, filename='release-dates')
 def parse_release_dates(f):
 
-  skip_till(f, 2, r'^RELEASE DATES LIST\n={8}')
+  skip_till(f, 'RELEASE DATES LIST')
 
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
-    l = [i for i in l.split('\t') if i]
-    p2 = l[1].split(':', 1)
+    # see parse_language
+    id, _, val = l.partition('\t')
+    val, _, note = val.lstrip('\t').partition('\t')
+    p2 = val.split(':', 1)
     rd = {'country': p2[0], 'date': p2[1]} # TODO parse date
-    if len(l) > 2:
-      rd['note'] = l[2]
-    yield l[0], APPEND, 'release_dates', rd
+    if note:
+      rd['note'] = note.lstrip('\t').partition('\t')[0]
+    yield id, APPEND, 'release_dates', rd
 
 @imdb_parser(kind=TITLE, filename='soundtracks')
 def parse_sound_mix(f):
-  skip_till(f, 2, r'^SOUNDTRACKS\n={8}')
+  skip_till(f, 'SOUNDTRACKS')
   yield from parse_bullet_pt(f, 'soundtracks')
 
 @imdb_parser(kind=TITLE, filename='sound-mix')
 def parse_sound_mix(f):
 
-  skip_till(f, 2, r'^SOUND-MIX LIST\n={8}')
+  skip_till(f, 'SOUND-MIX LIST')
 
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
-    l = [i for i in l.split('\t') if i]
-    mix = {'type': l[1].lower()}
-    if len(l) > 2:
-      mix['note'] = l[2]
-    yield l[0], APPEND, 'sound_mix', mix
+    # see parse_language
+    id, _, val = l.partition('\t')
+    val, _, note = val.lstrip('\t').partition('\t')
+    mix = {'type': val.lower()}
+    if note:
+      mix['note'] = note.lstrip('\t').partition('\t')[0]
+    yield id, APPEND, 'sound_mix', mix
 
 @imdb_parser(kind=TITLE, filename='plot')
 def parse_plot(f):
 
-  skip_till(f, 2, r'^PLOT SUMMARIES LIST\n={8}')
+  skip_till(f, 'PLOT SUMMARIES LIST')
 
   id, lines, author = None, [], None
   for l in f:
-    if l.startswith('--------------'):
+    tag = l[:4]
+    if tag == 'PL: ':
+      lines.append(l[4:])
+    elif tag == 'MV: ':
+      id = l[4:]
+    elif l[0] == '-' and l.startswith(_SEP):
       if id and lines:
         yield id, APPEND, 'plots', {'plot': ' '.join(lines)}
       id, lines, author = None, [], None
-    elif l.startswith('MV: '):
-      id = l[4:]
-    elif l.startswith('PL: '):
-      lines.append(l[4:])
-    elif l.startswith('BY: '):
+    elif tag == 'BY: ':
       author = l[4:]
       yield id, APPEND, 'plots', {'by': author, 'plot': ' '.join(lines)}
       lines, author = [], None
@@ -677,39 +933,79 @@ for filename, role in [
 ]:
   people_parser_gen(filename, role)
 
-def parse_people(f, prole):
+ROLE_PAT = re.compile(r'''
+  (?:\s\s (?P<note> \([^)]+\) (?:\s\([^)]+\))? ) )?
+  (?:\s\s\[(?P<character>[^\]]+)\])?
+  (?:\s\s<(?P<ranks>[^>]+)>)?
+  $
+''', re.X)
+
+def role_details(s):
+  # peel the usual "  (note)  [character]  <ranks>" suffixes off the end
+  # with plain string ops, anything that doesn't fit exactly is left to
+  # ROLE_PAT
+  note = character = ranks = None
+  rest = s
+  if rest[-1] == '>':
+    i = rest.rfind('  <')
+    ranks = rest[i + 3:-1]
+    if i < 0 or not ranks or '>' in ranks:
+      return role_details_re(s)
+    rest = rest[:i]
+  if rest[-1:] == ']':
+    i = rest.rfind('  [')
+    character = rest[i + 3:-1]
+    if i < 0 or not character or ']' in character:
+      return role_details_re(s)
+    rest = rest[:i]
+  if rest[-1:] == ')' and rest[:3] == '  (':
+    note = rest[2:]
+    i = note.find(')')
+    if i == len(note) - 1:
+      ok = i > 1
+    else:
+      ok = i > 1 and note[i + 1:i + 3] == ' (' \
+        and note.find(')', i + 3) == len(note) - 1 and len(note) > i + 4
+    if not ok:
+      return role_details_re(s)
+    rest = ''
+  if rest:
+    return role_details_re(s)
+  return note, character, ranks
+
+def role_details_re(s):
+  m = ROLE_PAT.search(s)
+  if m:
+    return m.group('note'), m.group('character'), m.group('ranks')
 
-  skip_till(f, 2, r'^Name\s+Titles\n----\s+-----')
+def parse_people(f, prole):
 
-  role_pat = re.compile(r'''
-    (?:\s\s (?P<note> \([^)]+\) (?:\s\([^)]+\))? ) )?
-    (?:\s\s\[(?P<character>[^\]]+)\])?
-    (?:\s\s<(?P<ranks>[^>]+)>)?
-    $
-  ''', re.X)
+  skip_till(f, 'Name Titles', '----')
+  prole_note = '(%s)' % prole
 
   def get_role(v):
     v = v.split('  ', 1)
     role = {'title': v[0], 'role': prole}
     if len(v) > 1:
-      m = role_pat.search('  ' + v[1])
+      m = role_details('  ' + v[1])
       if m:
-        if m.group('note'):
+        note, character, ranks = m
+        if note:
           # TODO more processing here needed
-          note = m.group('note').replace('(%s)' % prole, '').strip()
+          note = note.replace(prole_note, '').strip()
           if note:
             role['note'] = note
-        if m.group('character'):
-          role['character'] = m.group('character')
-        if m.group('ranks'):
-          role['ranks'] = list(map(int, m.group('ranks').split(',')))
+        if character:
+          role['character'] = character
+        if ranks:
+          role['ranks'] = list(map(int, ranks.split(',')))
       else:
         print('bad-role', v, file=sys.stderr)
     return role
 
   id = None
   for l in f:
-    if l.startswith('--------------'):
+    if l[0] == '-' and l.startswith(_SEP):
       break
     l = l.split('\t')
     if id or l[0]:
@@ -720,29 +1016,42 @@ def parse_people(f, prole):
 @imdb_parser(kind=NAME, filename='aka-names')
 def parse_aka_names(f):
 
-  skip_till(f, 2, r'^AKA NAMES LIST\n={8}')
+  skip_till(f, 'AKA NAMES LIST')
 
   id = None
   for l in f:
     if l.startswith(' '):
       if not l.startswith('   (aka ') or not l.endswith(')'):
-        print('bad-aka-name', l)
+        print('bad-aka-name', l, file=sys.stderr)
         continue
       if id:
         yield id, APPEND, 'aka', l[8:-1]
     else:
       id = l
 
+BIO_LISTS = (
+  ('OW', 'other_works'), ('BO', 'print_biography'),
+  ('QU', 'quotes'), ('IT', 'interviews'), ('AT', 'articles'),
+  ('CV', 'cover_photos'), ('TR', 'trivia'), ('SP', 'spuoses'),
+  ('PT', 'pictorials'), ('TM', 'trademarks'), ('PI', 'portrayals'),
+  ('SA', 'salaries'), ('BT', 'biographical_movies')
+)
+
+BIO_SINGLES = (
+  ('DD', 'date_of_death'), ('DB', 'date_of_birth'),
+  ('HT', 'height'), ('RN', 'real_name')
+)
+
 @imdb_parser(kind=NAME, filename='biographies')
 def parse_biographies(f):
 
-  skip_till(f, 2, r'^BIOGRAPHY LIST\n={8}')
+  skip_till(f, 'BIOGRAPHY LIST')
 
   def build_bio(b):
     bio = {}
     bio_texts = []
 
-    for text, by in b['BIO']:
+    for text, by in b.get('BIO', ()):
       text = ' '.join(i if i else '\n' for i in text)
       text = text.replace(' \n ', '\n').strip()
       if text:
@@ -750,13 +1059,10 @@ def parse_biographies(f):
     if bio_texts:
       bio['biographies'] = bio_texts
 
-    for short, long in [
-      ('OW', 'other_works'), ('BO', 'print_biography'),
-      ('QU', 'quotes'), ('IT', 'interviews'), ('AT', 'articles'),
-      ('CV', 'cover_photos'), ('TR', 'trivia'), ('SP', 'spuoses'),
-      ('PT', 'pictorials'), ('TM', 'trademarks'), ('PI', 'portrayals'),
-      ('SA', 'salaries'), ('BT', 'biographical_movies')
-    ]:
+    # most people only have a few of the sections
+    for short, long in BIO_LISTS:
+      if short not in b:
+        continue
       coll, el = [], []
       for l in b[short]:
         if l.startswith('*'):
@@ -769,32 +1075,29 @@ def parse_biographies(f):
       if coll:
         bio[long] = coll
 
-    for short, long in [
-      ('DD', 'date_of_death'), ('DB', 'date_of_birth'),
-      ('HT', 'height'), ('RN', 'real_name')
-    ]:
-      if b[short]:
+    for short, long in BIO_SINGLES:
+      if short in b:
         bio[long] = b[short][0]
 
     # TODO data extraction for various fields (e.g. DOB)
     return bio
 
-  id, bio = None, collections.defaultdict(list)
+  # every line is a two letter tag, a colon and a space before the value
+  id, bio = None, {}
   for l in f:
-    if l.startswith('-------'):
+    if l[0] == '-' and l.startswith('-------'):
       if bio and id:
         for k, v in build_bio(bio).items():
           yield id, STORE, k, v
-      id, bio = None, collections.defaultdict(list)
+      id, bio = None, {}
     else:
-      l = l.split(':', 1)
-      if l[0] == 'NM':
-        id = l[1][1:]
-      elif l[0] == 'BY':
-        bio['BIO'].append((bio['BG'], l[1][1:]))
-        del bio['BG']
+      tag = l[:2]
+      if tag == 'NM':
+        id = l[4:]
+      elif tag == 'BY':
+        bio.setdefault('BIO', []).append((bio.pop('BG', []), l[4:]))
       else:
-        bio[l[0]].append(l[1][1:])
+        bio.setdefault(tag, []).append(l[4:])
   if bio and id:
     for k, v in build_bio(bio).items():
       yield id, STORE, k, v
@@ -836,6 +1139,12 @@ def main():
     type=file_arg,
     help=".list or .list.gz file, '-' means stdin"
   )
+  parser_a.add_argument(
+    '-j', '--jobs',
+    type=int,
+    default=_CPUS,
+    help='parse and sort up to this many files in parallel'
+  )
   parser_a = subparsers.add_parser(
     'merge',
     help='merge multiple JSON streams into one'
@@ -869,38 +1178,56 @@ def do_list(args):
 
 def do_merge(args):
 
-  for id, recs in itertools.groupby(heapq.merge(*(
-    (json.loads(l) for l in open(f.fileno(), 'r', encoding='utf8'))
-    for f in args.file
-  ), key=lambda x: x['id']), key=lambda x: x['id']):
-    rec = {}
-    for r in recs:
-      rec.update(r)
-    json.dump(rec, sys.stdout)
-    print()
+  by_id = operator.itemgetter('id')
+
+  def merged():
+    for id, recs in itertools.groupby(heapq.merge(*(
+      map(load_line, open(f.fileno(), 'rb', buffering=_IN_BUF))
+      for f in args.file
+    ), key=by_id), key=by_id):
+      rec = {}
+      for r in recs:
+        rec.update(r)
+      yield rec
+
+  # writelines drives the whole stream from C, no write() call per record
+  sys.stdout.buffer.writelines(map(dump_line, merged()))
+  sys.stdout.flush()
 
 def do_convert(args):
 
   construct = constructors[args.kind]
 
-  for id, tuples in itertools.groupby(rec_sorted(roundrobin(
-    *(load_parser(args.kind, f) for f in args.file)
-  )), key=lambda x: x[0]):
+  # each input is parsed and sorted on its own, in parallel when we can
+  # fork and no fd is given twice (such as '-'); otherwise one after the
+  # other so that only one decompressor and parser is alive at a time
+  jobs = min(args.jobs, len(args.file))
+  if jobs > 1 and 'fork' in multiprocessing.get_all_start_methods() \
+    and len({f.fileno() for f in args.file}) == len(args.file):
+    runs = parallel_runs(args.kind, args.file, jobs)
+  else:
+    runs = sort_runs(itertools.chain.from_iterable(
+      prefetch(load_parser(args.kind, f)) for f in args.file
+    ), mem_bytes=_MEM_RUN_BYTES)
+
+  def records():
+    for id, tuples in merge_runs(runs):
 
-    rec = construct(id)
+      rec = construct(id)
 
-    for _, mix, key, value in tuples:
-      if mix == STORE:
-        rec[key] = value
-      elif mix == APPEND:
-        lst = rec.get(key)
-        if lst is None:
-          rec[key] = lst = []
-        lst.append(value)
+      for _, mix, key, value in tuples:
+        if mix == STORE:
+          rec[key] = value
+        elif mix == APPEND:
+          lst = rec.get(key)
+          if lst is None:
+            rec[key] = lst = []
+          lst.append(value)
 
-    json.dump(rec, sys.stdout)
-    print()
+      yield rec
 
+  # see do_merge
+  sys.stdout.buffer.writelines(map(dump_line, records()))
   sys.stdout.flush()
 
 if __name__ == '__main__':